@@ -13,11 +13,16 @@
 # limitations under the License.
 
 import argparse
+import queue
 import re
+import threading
+from functools import lru_cache
 
+import numpy as np
 import paddle
 from utils import decoding, load_dict
 
+from paddlenlp.data import Pad
 from paddlenlp.transformers import (
     SkepForSequenceClassification,
     SkepForTokenClassification,
@@ -25,20 +30,46 @@ from paddlenlp.transformers import (
 )
 
 
-def is_aspect_first(text, aspect, opinion_word):
-    return text.find(aspect) <= text.find(opinion_word)
+def concate_aspect_and_opinion(text, aspect, opinion_words):
+    aspect_pos = text.find(aspect)
+    parts = [
+        aspect + opinion_word if aspect_pos <= text.find(opinion_word) else opinion_word + aspect
+        for opinion_word in opinion_words
+    ]
 
+    return "，".join(parts)
 
-def concate_aspect_and_opinion(text, aspect, opinion_words):
-    aspect_text = ""
-    for opinion_word in opinion_words:
-        if is_aspect_first(text, aspect, opinion_word):
-            aspect_text += aspect + opinion_word + "，"
-        else:
-            aspect_text += opinion_word + aspect + "，"
-    aspect_text = aspect_text[:-1]
 
-    return aspect_text
+class OnnxModel(object):
+    """
+    Runs a static model exported by `export_model.py` with onnxruntime.
+    It takes and returns numpy arrays.
+    """
+
+    def __init__(self, model_path_prefix, device="cpu", num_threads=None):
+        import onnxruntime as ort
+        import paddle2onnx
+
+        onnx_model = paddle2onnx.export(
+            model_file=model_path_prefix + ".pdmodel",
+            params_file=model_path_prefix + ".pdiparams",
+            opset_version=13,
+            enable_onnx_checker=True,
+        )
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is not None:
+            sess_options.intra_op_num_threads = num_threads
+        providers = ["CUDAExecutionProvider"] if device == "gpu" else ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(onnx_model, sess_options=sess_options, providers=providers)
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, input_ids, token_type_ids):
+        inputs = dict(zip(self.input_names, [input_ids, token_type_ids]))
+        return self.session.run(None, inputs)[0]
 
 
 def format_print(results):
@@ -53,47 +84,127 @@ def predict(args, ext_model, cls_model, tokenizer, ext_id2label, cls_id2label):
     ext_model.eval()
     cls_model.eval()
 
-    while True:
-        input_text = input("input text: \n")
-        input_text = re.sub(" +", "", input_text.strip())
-        if not input_text:
-            continue
-        if input_text == "quit" or input_text == "exit":
-            break
+    # repeated utterances are common in interactive use, so memoize tokenization
+    # results as plain lists keyed on the raw text
+    @lru_cache(maxsize=8192)
+    def tokenize_ext(text):
+        encoded_inputs = tokenizer(list(text), is_split_into_words=True, max_seq_len=args.ext_max_seq_len)
+        return encoded_inputs["input_ids"], encoded_inputs["token_type_ids"]
+
+    @lru_cache(maxsize=8192)
+    def tokenize_ids(text):
+        return tuple(tokenizer.convert_tokens_to_ids(tokenizer.tokenize(text)))
+
+    num_special_tokens = tokenizer.num_special_tokens_to_add(pair=True)
+
+    # the input text is tokenized once and shared by all of its aspects, each pair is then
+    # truncated and joined with special tokens the same way as `tokenizer(aspect_text, text_pair=text)`
+    @lru_cache(maxsize=8192)
+    def tokenize_cls(aspect_text, text):
+        aspect_ids, text_ids = list(tokenize_ids(aspect_text)), list(tokenize_ids(text))
+        num_tokens_to_remove = len(aspect_ids) + len(text_ids) + num_special_tokens - args.cls_max_seq_len
+        if num_tokens_to_remove > 0:
+            aspect_ids, text_ids, _ = tokenizer.truncate_sequences(
+                aspect_ids, pair_ids=text_ids, num_tokens_to_remove=num_tokens_to_remove
+            )
+        input_ids = tokenizer.build_inputs_with_special_tokens(aspect_ids, text_ids)
+        token_type_ids = tokenizer.create_token_type_ids_from_sequences(aspect_ids, text_ids)
+        return input_ids, token_type_ids
 
-        input_text = input_text.strip().replace(" ", "")
+    pad_input_ids = Pad(axis=0, pad_val=tokenizer.pad_token_id, dtype="int64")
+    pad_token_type_ids = Pad(axis=0, pad_val=tokenizer.pad_token_type_id, dtype="int64")
+    # map predicted ids to labels with a single gather instead of per-token dict lookups
+    ext_label_arr = np.array([ext_id2label[idx] for idx in range(len(ext_id2label))], dtype=object)
+    cls_label_arr = np.array([cls_id2label[idx] for idx in range(len(cls_id2label))], dtype=object)
+
+    def to_inputs(*fields):
+        if args.use_onnxruntime:
+            return [np.asarray(field, dtype="int64") for field in fields]
+        return [paddle.to_tensor(field, dtype="int64") for field in fields]
+
+    def read_inputs():
+        # the prompt would interleave with the results printed by the main thread in pipeline mode
+        prompt = "" if args.pipeline else "input text: \n"
+        while True:
+            try:
+                input_text = input(prompt)
+            except EOFError:
+                break
+            input_text = re.sub(" +", "", input_text.strip())
+            if not input_text:
+                continue
+            if input_text == "quit" or input_text == "exit":
+                break
+            yield input_text.strip().replace(" ", "")
+
+    def extract(input_text):
         # processing input text
-        encoded_inputs = tokenizer(list(input_text), is_split_into_words=True, max_seq_len=args.ext_max_seq_len)
-        input_ids = paddle.to_tensor([encoded_inputs["input_ids"]])
-        token_type_ids = paddle.to_tensor([encoded_inputs["token_type_ids"]])
+        input_ids, token_type_ids = tokenize_ext(input_text)
+        input_ids, token_type_ids = to_inputs([input_ids], [token_type_ids])
 
         # extract aspect and opinion words
         logits = ext_model(input_ids, token_type_ids=token_type_ids)
-        predictions = logits.argmax(axis=2).numpy()[0]
-        tag_seq = [ext_id2label[idx] for idx in predictions][1:-1]
+        predictions = np.asarray(logits).argmax(axis=2)[0]
+        tag_seq = ext_label_arr[predictions[1:-1]].tolist()
 
-        aps = decoding(input_text[: args.ext_max_seq_len - 2], tag_seq)
+        return decoding(input_text[: args.ext_max_seq_len - 2], tag_seq)
 
-        # predict sentiment for aspect with cls_model
-        results = []
+    def classify(input_text, aps):
+        # predict sentiment for all aspects with cls_model in one batch
+        aspects, opinions_list, aspect_texts = [], [], []
         for ap in aps:
             aspect = ap[0]
             opinion_words = list(set(ap[1:]))
-            aspect_text = concate_aspect_and_opinion(input_text, aspect, opinion_words)
+            aspects.append(aspect)
+            opinions_list.append(opinion_words)
+            aspect_texts.append(concate_aspect_and_opinion(input_text, aspect, opinion_words))
 
-            encoded_inputs = tokenizer(
-                aspect_text, text_pair=input_text, max_seq_len=args.cls_max_seq_len, return_length=True
+        results = []
+        if aspect_texts:
+            encoded_inputs = [tokenize_cls(aspect_text, input_text) for aspect_text in aspect_texts]
+            input_ids, token_type_ids = to_inputs(
+                pad_input_ids([ids for ids, _ in encoded_inputs]),
+                pad_token_type_ids([type_ids for _, type_ids in encoded_inputs]),
             )
-            input_ids = paddle.to_tensor([encoded_inputs["input_ids"]])
-            token_type_ids = paddle.to_tensor([encoded_inputs["token_type_ids"]])
 
             logits = cls_model(input_ids, token_type_ids=token_type_ids)
-            prediction = int(logits.argmax(axis=1))
+            predictions = np.asarray(logits).argmax(axis=1)
+
+            sentiments = cls_label_arr[predictions].tolist()
+            for aspect, opinion_words, sentiment in zip(aspects, opinions_list, sentiments):
+                result = {"aspect": aspect, "opinions": opinion_words, "sentiment_polarity": sentiment}
+                results.append(result)
+        return results
 
-            result = {"aspect": aspect, "opinions": opinion_words, "sentiment_polarity": cls_id2label[prediction]}
-            results.append(result)
+    if not args.pipeline:
+        for input_text in read_inputs():
+            format_print(classify(input_text, extract(input_text)))
+        return
 
-        format_print(results)
+    # A producer thread reads and extracts the next input while the main thread
+    # classifies the current one, so their preprocessing and model calls overlap.
+    ext_queue = queue.Queue(maxsize=2)
+
+    def produce():
+        try:
+            for input_text in read_inputs():
+                ext_queue.put((input_text, extract(input_text)))
+        except BaseException as e:
+            # hand the error over to the main thread instead of ending the loop as on EOF
+            ext_queue.put(e)
+        else:
+            ext_queue.put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    while True:
+        item = ext_queue.get()
+        if item is None:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        format_print(classify(*item))
+    producer.join()
 
 
 if __name__ == "__main__":
@@ -105,9 +216,17 @@ if __name__ == "__main__":
     parser.add_argument("--cls_label_path", type=str, default=None, help="The path of classification label dict.")
     parser.add_argument("--ext_max_seq_len", type=int, default=512, help="The maximum total input sequence length after tokenization for extraction model.")
     parser.add_argument("--cls_max_seq_len", type=int, default=512, help="The maximum total input sequence length after tokenization for classification model.")
+    parser.add_argument("--pipeline", action="store_true", help="Whether to extract the next input in a background thread while classifying the current one, useful when inputs are piped in. Requires --use_onnxruntime.")
+    parser.add_argument("--use_onnxruntime", action="store_true", help="Whether to run the static models exported by export_model.py with onnxruntime instead of the dynamic graph models.")
+    parser.add_argument("--ext_static_model_prefix", type=str, default="./checkpoints/ext_checkpoints/static/infer", help="The path prefix of the static extraction model, used with --use_onnxruntime.")
+    parser.add_argument("--cls_static_model_prefix", type=str, default="./checkpoints/cls_checkpoints/static/infer", help="The path prefix of the static classification model, used with --use_onnxruntime.")
     args = parser.parse_args()
     # yapf: enbale
 
+    if args.pipeline and not args.use_onnxruntime:
+        # the dynamic graph models would share Paddle's global dygraph state across the two threads
+        raise ValueError("--pipeline runs the two models in separate threads and requires --use_onnxruntime.")
+
     # load dict
     model_name = "skep_ernie_1.0_large_ch"
     ext_label2id, ext_id2label = load_dict(args.ext_label_path)
@@ -115,17 +234,24 @@ if __name__ == "__main__":
     tokenizer = SkepTokenizer.from_pretrained(model_name)
     print("label dict loaded.")
 
-    # load ext model
-    ext_state_dict = paddle.load(args.ext_model_path)
-    ext_model = SkepForTokenClassification.from_pretrained(model_name, num_classes=len(ext_label2id))
-    ext_model.load_dict(ext_state_dict)
-    print("extraction model loaded.")
-
-    # load cls model
-    cls_state_dict = paddle.load(args.cls_model_path)
-    cls_model = SkepForSequenceClassification.from_pretrained(model_name, num_classes=len(cls_label2id))
-    cls_model.load_dict(cls_state_dict)
-    print("classification model loaded.")
+    if args.use_onnxruntime:
+        device = "gpu" if paddle.get_device().startswith("gpu") else "cpu"
+        ext_model = OnnxModel(args.ext_static_model_prefix, device=device)
+        print("extraction model loaded.")
+        cls_model = OnnxModel(args.cls_static_model_prefix, device=device)
+        print("classification model loaded.")
+    else:
+        # load ext model
+        ext_state_dict = paddle.load(args.ext_model_path)
+        ext_model = SkepForTokenClassification.from_pretrained(model_name, num_classes=len(ext_label2id))
+        ext_model.load_dict(ext_state_dict)
+        print("extraction model loaded.")
+
+        # load cls model
+        cls_state_dict = paddle.load(args.cls_model_path)
+        cls_model = SkepForSequenceClassification.from_pretrained(model_name, num_classes=len(cls_label2id))
+        cls_model.load_dict(cls_state_dict)
+        print("classification model loaded.")
 
     # do predict
     predict(args, ext_model, cls_model, tokenizer, ext_id2label, cls_id2label)
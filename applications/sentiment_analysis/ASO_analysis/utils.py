@@ -13,11 +13,14 @@
 # limitations under the License.
 
 import random
+import re
 
 import numpy as np
 import paddle
 from seqeval.metrics.sequence_labeling import get_entities
 
+PUNCS_PATTERN = re.compile("[,.?;!，。？；！]")
+
 
 def set_seed(seed):
     paddle.seed(seed)
@@ -44,17 +47,10 @@ def read_test_file(data_path):
 def decoding(text, tag_seq):
     assert len(text) == len(tag_seq), f"text len: {len(text)}, tag_seq len: {len(tag_seq)}"
 
-    puncs = list(",.?;!，。？；！")
-    splits = [idx for idx in range(len(text)) if text[idx] in puncs]
-
-    prev = 0
-    sub_texts, sub_tag_seqs = [], []
-    for i, split in enumerate(splits):
-        sub_tag_seqs.append(tag_seq[prev:split])
-        sub_texts.append(text[prev:split])
-        prev = split
-    sub_tag_seqs.append(tag_seq[prev:])
-    sub_texts.append((text[prev:]))
+    splits = [match.start() for match in PUNCS_PATTERN.finditer(text)]
+    starts, ends = [0] + splits, splits + [len(text)]
+    sub_texts = [text[start:end] for start, end in zip(starts, ends)]
+    sub_tag_seqs = [tag_seq[start:end] for start, end in zip(starts, ends)]
 
     ents_list = []
     for sub_text, sub_tag_seq in zip(sub_texts, sub_tag_seqs):
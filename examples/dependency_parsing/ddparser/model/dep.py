@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
+
 import paddle
 import paddle.nn as nn
+import paddle.nn.functional as F
 
 from model.dropouts import SharedDropout
 from model.encoder import LSTMEncoder, LSTMByWPEncoder, ErnieEncoder
@@ -47,11 +50,9 @@ class BiAffineParser(nn.Layer):
         else:
             self.embed = ErnieEncoder(pad_index, pretrained_model)
 
-        # MLP layer
-        self.mlp_arc_h = MLP(n_in=self.embed.mlp_input_size, n_out=n_mlp_arc, dropout=mlp_dropout)
-        self.mlp_arc_d = MLP(n_in=self.embed.mlp_input_size, n_out=n_mlp_arc, dropout=mlp_dropout)
-        self.mlp_rel_h = MLP(n_in=self.embed.mlp_input_size, n_out=n_mlp_rel, dropout=mlp_dropout)
-        self.mlp_rel_d = MLP(n_in=self.embed.mlp_input_size, n_out=n_mlp_rel, dropout=mlp_dropout)
+        # MLP layer, the arc_h, arc_d, rel_h and rel_d projections are computed by one fused MLP
+        self.mlp_sizes = [n_mlp_arc, n_mlp_arc, n_mlp_rel, n_mlp_rel]
+        self.mlp = MLP(n_in=self.embed.mlp_input_size, n_out=self.mlp_sizes, dropout=mlp_dropout)
 
         # Biaffine layer
         self.arc_attn = BiAffine(n_in=n_mlp_arc, bias_x=True, bias_y=False)
@@ -62,10 +63,7 @@ class BiAffineParser(nn.Layer):
         words, x = self.embed(words, feats)
         mask = paddle.logical_and(words != self.pad_index, words != self.eos_index)
 
-        arc_h = self.mlp_arc_h(x)
-        arc_d = self.mlp_arc_d(x)
-        rel_h = self.mlp_rel_h(x)
-        rel_d = self.mlp_rel_d(x)
+        arc_h, arc_d, rel_h, rel_d = paddle.split(self.mlp(x), self.mlp_sizes, axis=-1)
 
         # Get arc and rel scores from the bilinear attention
         # Shape: (batch_size, seq_len, seq_len)
@@ -79,6 +77,20 @@ class BiAffineParser(nn.Layer):
         )
         return s_arc, s_rel, words
 
+    def set_state_dict(self, state_dict, use_structured_name=True):
+        # Checkpoints saved before the MLP layers were fused hold the four projections separately
+        legacy_names = ["mlp_arc_h", "mlp_arc_d", "mlp_rel_h", "mlp_rel_d"]
+        if all(name + ".linear.weight" in state_dict for name in legacy_names):
+            state_dict = dict(state_dict)
+            for param in ["weight", "bias"]:
+                state_dict["mlp.linear." + param] = paddle.concat(
+                    [paddle.to_tensor(state_dict.pop(name + ".linear." + param)) for name in legacy_names], axis=-1
+                )
+        return super(BiAffineParser, self).set_state_dict(state_dict, use_structured_name=use_structured_name)
+
+    set_dict = set_state_dict
+    load_dict = set_state_dict
+
 
 class MLP(nn.Layer):
     """MLP"""
@@ -86,11 +98,21 @@ class MLP(nn.Layer):
     def __init__(self, n_in, n_out, dropout=0):
         super(MLP, self).__init__()
 
+        # n_out can be a list of sizes, which fuses several MLPs into one linear layer
+        n_outs = n_out if isinstance(n_out, (list, tuple)) else [n_out]
         self.linear = nn.Linear(
             n_in,
-            n_out,
+            sum(n_outs),
             weight_attr=nn.initializer.XavierNormal(),
         )
+        if len(n_outs) > 1:
+            # Initialize each fused slice with its own fan_out, as if the MLPs were created separately
+            self.linear.weight.set_value(
+                paddle.concat(
+                    [paddle.normal(std=math.sqrt(2.0 / (n_in + size)), shape=[n_in, size]) for size in n_outs],
+                    axis=-1,
+                )
+            )
         self.leaky_relu = nn.LeakyReLU(negative_slope=0.1)
         self.dropout = SharedDropout(p=dropout)
 
@@ -115,25 +137,18 @@ class BiAffine(nn.Layer):
         self.weight = self.create_parameter(shape=[n_out, n_in + bias_x, n_in + bias_y], dtype="float32")
 
     def forward(self, x, y):
+        # Append a bias column of ones to the last dim
         if self.bias_x:
-            x = paddle.concat([x, paddle.ones_like(x[:, :, :1])], axis=-1)
+            x = F.pad(x, [0, 1], mode="constant", value=1.0, data_format="NCL")
         if self.bias_y:
-            y = paddle.concat([y, paddle.ones_like(x[:, :, :1])], axis=-1)
-        # Shape x: (batch_size, num_tokens, input_size + bias_x)
-        b = x.shape[0]
-        o = self.weight.shape[0]
-        # Shape x: (batch_size, output_size, num_tokens, input_size + bias_x)
-        x = paddle.expand(paddle.unsqueeze(x, axis=1), shape=(x.shape[0], o, x.shape[1], x.shape[2]))
-        # Shape y: (batch_size, output_size, num_tokens, input_size + bias_y)
-        y = paddle.expand(paddle.unsqueeze(y, axis=1), shape=(y.shape[0], o, y.shape[1], y.shape[2]))
-        # Shape weight: (batch_size, output_size, input_size + bias_x, input_size + bias_y)
-        weight = paddle.expand(
-            paddle.unsqueeze(self.weight, axis=0),
-            shape=(b, self.weight.shape[0], self.weight.shape[1], self.weight.shape[2]),
-        )
-
+            y = F.pad(y, [0, 1], mode="constant", value=1.0, data_format="NCL")
+        # Shape x: (batch_size, 1, num_tokens, input_size + bias_x)
+        x = paddle.unsqueeze(x, axis=1)
+        # Shape y: (batch_size, 1, num_tokens, input_size + bias_y)
+        y = paddle.unsqueeze(y, axis=1)
+        # Broadcast over batch_size and output_size instead of expanding the inputs and the weight
         # Shape: (batch_size, output_size, num_tokens, num_tokens)
-        s = paddle.matmul(paddle.matmul(x, weight), paddle.transpose(y, perm=[0, 1, 3, 2]))
+        s = paddle.matmul(paddle.matmul(x, self.weight), y, transpose_y=True)
         # Remove dim 1 if n_out == 1
         if s.shape[1] == 1:
             s = paddle.squeeze(s, axis=1)
@@ -104,5 +104,15 @@ def parse_args():
         "--device", default="gpu", choices=["gpu", "cpu", "xpu"], help="Device selected for inference."
     )
 
+    parser.add_argument("--use_amp", action="store_true", help="If True, enable mixed precision training.")
+
+    parser.add_argument(
+        "--to_static",
+        action="store_true",
+        help="If True, run the forward pass of the student model as a static graph.",
+    )
+
+    parser.add_argument("--scale_loss", type=float, default=1024.0, help="The initial loss scaling for fp16 training.")
+
     args = parser.parse_args()
     return args
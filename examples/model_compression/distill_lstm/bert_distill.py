@@ -89,7 +89,10 @@ def do_train(agrs):
         args.dropout_prob,
         args.init_scale,
         args.embedding_name,
+        pair_input=args.task_name == "qqp",
     )
+    if args.to_static:
+        model.to_static()
 
     if args.optimizer == "adadelta":
         optimizer = paddle.optimizer.Adadelta(learning_rate=args.lr, rho=0.95, parameters=model.parameters())
@@ -111,6 +114,9 @@ def do_train(agrs):
         optimizer.set_state_dict(paddle.load(args.init_from_ckpt + ".pdopt"))
         print("Loaded checkpoint from %s" % args.init_from_ckpt)
 
+    if args.use_amp:
+        scaler = paddle.amp.GradScaler(init_loss_scaling=args.scale_loss)
+
     global_step = 0
     tic_train = time.time()
     for epoch in range(args.max_epoch):
@@ -130,20 +136,26 @@ def do_train(agrs):
             else:
                 bert_input_ids, bert_segment_ids, student_input_ids, seq_len, labels = batch
 
-            # Calculate teacher model's forward.
-            with paddle.no_grad():
-                teacher_logits = teacher.model(bert_input_ids, bert_segment_ids)
+            with paddle.amp.auto_cast(args.use_amp, level="O1"):
+                # Calculate teacher model's forward.
+                with paddle.no_grad():
+                    teacher_logits = teacher.model(bert_input_ids, bert_segment_ids)
 
-            # Calculate student model's forward.
-            if args.task_name == "qqp":
-                logits = model(student_input_ids_1, seq_len_1, student_input_ids_2, seq_len_2)
-            else:
-                logits = model(student_input_ids, seq_len)
+                # Calculate student model's forward.
+                if args.task_name == "qqp":
+                    logits = model(student_input_ids_1, seq_len_1, student_input_ids_2, seq_len_2)
+                else:
+                    logits = model(student_input_ids, seq_len)
 
-            loss = args.alpha * ce_loss(logits, labels) + (1 - args.alpha) * mse_loss(logits, teacher_logits)
+                loss = args.alpha * ce_loss(logits, labels) + (1 - args.alpha) * mse_loss(logits, teacher_logits)
 
-            loss.backward()
-            optimizer.step()
+            if args.use_amp:
+                scaled = scaler.scale(loss)
+                scaled.backward()
+                scaler.minimize(optimizer, scaled)
+            else:
+                loss.backward()
+                optimizer.step()
             optimizer.clear_grad()
 
             if global_step % args.log_freq == 0:
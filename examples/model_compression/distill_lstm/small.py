@@ -41,8 +41,10 @@ class BiLSTM(nn.Layer):
         dropout_prob=0.0,
         init_scale=0.1,
         embedding_name=None,
+        pair_input=False,
     ):
         super(BiLSTM, self).__init__()
+        self.pair_input = pair_input
         if embedding_name is not None:
             self.embedder = TokenEmbedding(
                 embedding_name, extended_vocab_path=vocab_path, keep_extended_vocab_only=True
@@ -71,21 +73,37 @@ class BiLSTM(nn.Layer):
             weight_attr=paddle.ParamAttr(initializer=I.Uniform(low=-init_scale, high=init_scale)),
         )
 
-    def forward(self, x_1, seq_len_1, x_2=None, seq_len_2=None):
-        x_embed_1 = self.embedder(x_1)
-        lstm_out_1, (hidden_1, _) = self.lstm(x_embed_1, sequence_length=seq_len_1)
-        out_1 = paddle.concat((hidden_1[-2, :, :], hidden_1[-1, :, :]), axis=1)
-        if x_2 is not None:
-            x_embed_2 = self.embedder(x_2)
-            lstm_out_2, (hidden_2, _) = self.lstm(x_embed_2, sequence_length=seq_len_2)
-            out_2 = paddle.concat((hidden_2[-2, :, :], hidden_2[-1, :, :]), axis=1)
-            out = paddle.concat(x=[out_1, out_2, out_1 + out_2, paddle.abs(out_1 - out_2)], axis=1)
-            out = paddle.tanh(self.fc_1(out))
-        else:
-            out = paddle.tanh(self.fc(out_1))
-        logits = self.output_layer(out)
+        # Bind the forward pass of the task once instead of branching on the inputs in every call
+        self._forward = self.forward_pair if pair_input else self.forward_single
+
+    def encode(self, x, seq_len):
+        x_embed = self.embedder(x)
+        lstm_out, (hidden, _) = self.lstm(x_embed, sequence_length=seq_len)
+        return paddle.concat((hidden[-2, :, :], hidden[-1, :, :]), axis=1)
+
+    def forward_single(self, x_1, seq_len_1):
+        out = paddle.tanh(self.fc(self.encode(x_1, seq_len_1)))
+        return self.output_layer(out)
+
+    def forward_pair(self, x_1, seq_len_1, x_2, seq_len_2):
+        out_1 = self.encode(x_1, seq_len_1)
+        out_2 = self.encode(x_2, seq_len_2)
+        out = paddle.concat(x=[out_1, out_2, out_1 + out_2, paddle.abs(out_1 - out_2)], axis=1)
+        out = paddle.tanh(self.fc_1(out))
+        return self.output_layer(out)
 
-        return logits
+    def forward(self, *inputs):
+        return self._forward(*inputs)
+
+    def to_static(self):
+        """Converts the forward pass of the task to a static graph, so that it runs without Python dispatch."""
+        num_texts = 2 if self.pair_input else 1
+        input_spec = []
+        for _ in range(num_texts):
+            input_spec.append(paddle.static.InputSpec(shape=[None, None], dtype="int64"))  # input_ids
+            input_spec.append(paddle.static.InputSpec(shape=[None], dtype="int64"))  # seq_len
+        self._forward = paddle.jit.to_static(self._forward, input_spec=input_spec)
+        return self
 
 
 def evaluate(task_name, model, loss_fct, metric, data_loader):
@@ -151,7 +169,10 @@ def do_train(args):
         args.dropout_prob,
         args.init_scale,
         args.embedding_name,
+        pair_input=args.task_name == "qqp",
     )
+    if args.to_static:
+        model.to_static()
 
     loss_fct = nn.CrossEntropyLoss()
 
@@ -165,22 +186,31 @@ def do_train(args):
         optimizer.set_state_dict(paddle.load(args.init_from_ckpt + ".pdopt"))
         print("Loaded checkpoint from %s" % args.init_from_ckpt)
 
+    if args.use_amp:
+        scaler = paddle.amp.GradScaler(init_loss_scaling=args.scale_loss)
+
     global_step = 0
     tic_train = time.time()
     for epoch in range(args.max_epoch):
         for i, batch in enumerate(train_data_loader):
             global_step += 1
-            if args.task_name == "qqp":
-                input_ids_1, seq_len_1, input_ids_2, seq_len_2, labels = batch
-                logits = model(input_ids_1, seq_len_1, input_ids_2, seq_len_2)
+            with paddle.amp.auto_cast(args.use_amp, level="O1"):
+                if args.task_name == "qqp":
+                    input_ids_1, seq_len_1, input_ids_2, seq_len_2, labels = batch
+                    logits = model(input_ids_1, seq_len_1, input_ids_2, seq_len_2)
+                else:
+                    input_ids, seq_len, labels = batch
+                    logits = model(input_ids, seq_len)
+
+                loss = loss_fct(logits, labels)
+
+            if args.use_amp:
+                scaled = scaler.scale(loss)
+                scaled.backward()
+                scaler.minimize(optimizer, scaled)
             else:
-                input_ids, seq_len, labels = batch
-                logits = model(input_ids, seq_len)
-
-            loss = loss_fct(logits, labels)
-
-            loss.backward()
-            optimizer.step()
+                loss.backward()
+                optimizer.step()
             optimizer.clear_grad()
 
             if global_step % args.log_freq == 0:
@@ -44,6 +44,30 @@ def create_dataloader(dataset, mode="train", batch_size=1, batchify_fn=None, tra
     return dataloader
 
 
+def use_fast_jieba(tokenizer):
+    """
+    Replaces the jieba segmenter of the tokenizer with `jieba_fast` if it is installed.
+    `jieba_fast` ports the DAG and HMM Viterbi search of jieba to C and is expected to segment the same way,
+    which is not guaranteed, so compare the results on your own data before relying on it.
+
+    Args:
+        tokenizer(obj: paddlenlp.data.JiebaTokenizer): It use jieba to cut the chinese string.
+
+    Returns:
+        tokenizer(obj: paddlenlp.data.JiebaTokenizer): The same tokenizer, backed by `jieba_fast` when available.
+    """
+    try:
+        import jieba_fast
+    except ImportError:
+        return tokenizer
+    fast_tokenizer = jieba_fast.Tokenizer()
+    fast_tokenizer.FREQ = tokenizer.tokenizer.FREQ
+    fast_tokenizer.total = tokenizer.tokenizer.total
+    fast_tokenizer.initialized = True
+    tokenizer.tokenizer = fast_tokenizer
+    return tokenizer
+
+
 def preprocess_prediction_data(data, tokenizer, pad_token_id=0, max_ngram_filter_size=3):
     """
     It process the prediction data as the format used as training.
@@ -13,13 +13,22 @@
 # limitations under the License.
 
 import argparse
+import os
+import queue
+import sys
+import threading
+from functools import lru_cache
 
 import numpy as np
 import paddle
 import paddle.nn.functional as F
+from paddle import inference
 
 from paddlenlp.data import JiebaTokenizer, Pad, Vocab
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+from data import use_fast_jieba  # noqa: E402
+
 parser = argparse.ArgumentParser()
 parser.add_argument(
     "--model_file",
@@ -50,12 +59,47 @@ parser.add_argument(
     default="gpu",
     help="Select which device to train model, defaults to gpu.",
 )
+parser.add_argument(
+    "--use_tensorrt", default=False, type=eval, choices=[True, False], help="Enable to use tensorrt to speed up."
+)
+parser.add_argument(
+    "--precision",
+    default="fp16",
+    type=str,
+    choices=["fp32", "fp16", "int8"],
+    help="The inference precision. fp32/fp16 apply to tensorrt, int8 expects a model quantized by quant_post.py.",
+)
+parser.add_argument(
+    "--pad_to_multiple_of",
+    default=None,
+    type=int,
+    help="If set, pad the sequence length of each batch to a multiple of this value, "
+    "e.g. 8 to let fp16 kernels run on Tensor Cores.",
+)
+parser.add_argument("--print_probs", action="store_true", help="If True, print the probabilities of all labels.")
+parser.add_argument(
+    "--collect_shape",
+    default=False,
+    type=eval,
+    choices=[True, False],
+    help="Whether to collect the input shape range for tensorrt into `shape_file`. "
+    "Run once with it enabled before deploying with tensorrt.",
+)
+parser.add_argument("--shape_file", default="shape_info.txt", type=str, help="The tensorrt shape range info file.")
 args = parser.parse_args()
 
 
-def convert_example(data, tokenizer, pad_token_id=0, max_ngram_filter_size=3):
+@lru_cache(maxsize=8192)
+def cached_encode(tokenizer, text):
+    """Memoizes `tokenizer.encode` on the raw text so repeated inputs skip jieba segmentation."""
+    return tuple(tokenizer.encode(text))
+
+
+def convert_example(data, tokenizer, pad_token_id=0, max_ngram_filter_size=3, max_seq_length=None):
     """convert_example"""
-    input_ids = tokenizer.encode(data)
+    input_ids = list(cached_encode(tokenizer, data))
+    if max_seq_length is not None:
+        input_ids = input_ids[:max_seq_length]
     seq_len = len(input_ids)
     # Sequence length should larger or equal than the maximum ngram_filter_size in TextCNN model
     if seq_len < max_ngram_filter_size:
@@ -64,18 +108,130 @@ def convert_example(data, tokenizer, pad_token_id=0, max_ngram_filter_size=3):
     return input_ids
 
 
+def round_up(value, multiple):
+    """Rounds `value` up to the nearest multiple of `multiple`."""
+    return (value + multiple - 1) // multiple * multiple
+
+
+def batchify(samples, pad_token_id=0, pad_to_multiple_of=None):
+    """Pads the samples to the longest one, rounded up to a multiple of `pad_to_multiple_of` if given."""
+    input_ids = Pad(axis=0, pad_val=pad_token_id)(samples)
+    if pad_to_multiple_of:
+        seq_len = input_ids.shape[1]
+        padded_len = round_up(seq_len, pad_to_multiple_of)
+        if padded_len > seq_len:
+            input_ids = np.pad(input_ids, ((0, 0), (0, padded_len - seq_len)), constant_values=pad_token_id)
+    return input_ids
+
+
+def convert_and_batchify(texts, tokenizer, pad_token_id=0, max_seq_length=None, pad_to_multiple_of=None):
+    """Converts a batch of texts to ids and pads them."""
+    examples = [
+        convert_example(text, tokenizer, pad_token_id=pad_token_id, max_seq_length=max_seq_length) for text in texts
+    ]
+    return batchify(examples, pad_token_id=pad_token_id, pad_to_multiple_of=pad_to_multiple_of)
+
+
+def prefetch(batches, buffer_size=2):
+    """
+    Iterates `batches` in a background thread, which keeps up to `buffer_size` batches ready ahead of the consumer.
+
+    Args:
+        batches(obj:`iterable`): The batches to iterate, which should not contain None.
+        buffer_size(obj:`int`, optional, defaults to 2): The maximum number of batches prepared ahead.
+
+    Returns:
+        batches(obj:`generator`): The same batches, in the same order.
+    """
+    batch_queue = queue.Queue(maxsize=buffer_size)
+
+    def produce():
+        try:
+            for batch in batches:
+                batch_queue.put(batch)
+        except BaseException as e:
+            # hand the error over to the consumer instead of ending the iteration silently
+            batch_queue.put(e)
+        else:
+            batch_queue.put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        batch = batch_queue.get()
+        if batch is None:
+            return
+        if isinstance(batch, BaseException):
+            raise batch
+        yield batch
+
+
 class Predictor(object):
-    def __init__(self, model_file, params_file, device, max_seq_length):
+    def __init__(
+        self,
+        model_file,
+        params_file,
+        device,
+        max_seq_length,
+        batch_size=1,
+        use_tensorrt=False,
+        precision="fp16",
+        max_ngram_filter_size=3,
+        pad_to_multiple_of=None,
+        collect_shape=False,
+        shape_file="shape_info.txt",
+    ):
+        if collect_shape and not (device == "gpu" and use_tensorrt):
+            raise ValueError("collect_shape only applies to tensorrt, run with --device=gpu --use_tensorrt=True")
+        if precision == "int8" and not (device == "cpu" or (device == "gpu" and use_tensorrt)):
+            raise ValueError(
+                "int8 precision runs with tensorrt or oneDNN, run with --device=gpu --use_tensorrt=True or --device=cpu"
+            )
         self.max_seq_length = max_seq_length
+        self.pad_to_multiple_of = pad_to_multiple_of
+        # The range of the padded sequence length fed to the model
+        self.min_seq_len, self.max_seq_len = max_ngram_filter_size, max_seq_length
+        if pad_to_multiple_of:
+            self.min_seq_len = round_up(self.min_seq_len, pad_to_multiple_of)
+            self.max_seq_len = round_up(self.max_seq_len, pad_to_multiple_of)
 
         config = paddle.inference.Config(model_file, params_file)
         if device == "gpu":
             # set GPU configs accordingly
+            # such as initialize the gpu memory, enable tensorrt
             config.enable_use_gpu(100, 0)
+            precision_map = {
+                "fp16": inference.PrecisionType.Half,
+                "fp32": inference.PrecisionType.Float32,
+                "int8": inference.PrecisionType.Int8,
+            }
+
+            if use_tensorrt:
+                config.enable_tensorrt_engine(
+                    workspace_size=1 << 30,
+                    max_batch_size=batch_size,
+                    min_subgraph_size=3,
+                    precision_mode=precision_map[precision],
+                    use_static=False,
+                    use_calib_mode=False,
+                )
+                # The sequence length varies between batches, so TensorRT is built from the shape range
+                # collected by `set_dynamic_shape` to avoid rebuilding the engine for unseen shapes.
+                if collect_shape:
+                    config.collect_shape_range_info(shape_file)
+                elif os.path.exists(shape_file):
+                    config.enable_tuned_tensorrt_dynamic_shape(shape_file, True)
+                else:
+                    raise ValueError(
+                        "not find shape file path {}, run with --collect_shape=True first".format(shape_file)
+                    )
         elif device == "cpu":
             # set CPU configs accordingly,
             # such as enable_mkldnn, set_cpu_math_library_num_threads
             config.disable_gpu()
+            if precision == "int8":
+                # run the quantized conv and matmul ops with oneDNN int8 kernels
+                config.enable_mkldnn()
+                config.enable_mkldnn_int8()
         elif device == "xpu":
             # set XPU configs accordingly
             config.enable_xpu(100)
@@ -86,7 +242,24 @@ class Predictor(object):
 
         self.output_handle = self.predictor.get_output_handle(self.predictor.get_output_names()[0])
 
-    def predict(self, data, tokenizer, label_map, batch_size=1, pad_token_id=0):
+    def set_dynamic_shape(self, batch_size, pad_token_id=0):
+        """
+        Runs the predictor on the minimum, maximum and a typical input shape, so that the shape range
+        info is recorded when the predictor is created with `collect_shape=True`.
+
+        Args:
+            batch_size(obj:`int`): The maximum batch size used in prediction.
+            pad_token_id(obj:`int`, optional, defaults to 0): The pad token index.
+        """
+        opt_seq_len = min(max(32, self.min_seq_len), self.max_seq_len)
+        if self.pad_to_multiple_of:
+            opt_seq_len = round_up(opt_seq_len, self.pad_to_multiple_of)
+        shapes = [[1, self.min_seq_len], [batch_size, self.max_seq_len], [batch_size, opt_seq_len]]
+        for shape in shapes:
+            self.input_handles[0].copy_from_cpu(np.full(shape, pad_token_id, dtype="int64"))
+            self.predictor.run()
+
+    def predict(self, data, tokenizer, label_map, batch_size=1, pad_token_id=0, return_probs=False, prefetch_size=2):
         """
         Predicts the data labels.
 
@@ -96,46 +269,81 @@ class Predictor(object):
             label_map(obj:`dict`): The label id (key) to label str (value) map.
             batch_size(obj:`int`, defaults to 1): The number of batch.
             pad_token_id(obj:`int`, optional, defaults to 0): The pad token index.
+            return_probs(obj:`bool`, optional, defaults to False): Whether to also return the label probabilities.
+            prefetch_size(obj:`int`, optional, defaults to 2): The number of batches tokenized and padded in a
+                background thread while the predictor runs the current one. 0 to prepare every batch in turn.
 
         Returns:
             results(obj:`dict`): All the predictions labels.
+            probs(obj:`list`): The probabilities of all labels for each data, only returned if `return_probs` is True.
         """
-        examples = []
-        for text in data:
-            input_ids = convert_example(text, tokenizer)
-            examples.append(input_ids)
+        # Separates data into some batches, which are converted lazily.
+        batches = (
+            convert_and_batchify(
+                data[idx : idx + batch_size],
+                tokenizer,
+                pad_token_id=pad_token_id,
+                max_seq_length=self.max_seq_length,
+                pad_to_multiple_of=self.pad_to_multiple_of,
+            )
+            for idx in range(0, len(data), batch_size)
+        )
+        if prefetch_size > 0:
+            # The thread shares the `cached_encode` cache and feeds numpy arrays straight to `copy_from_cpu`.
+            batches = prefetch(batches, buffer_size=prefetch_size)
 
-        # Separates data into some batches.
-        batches = [examples[idx : idx + batch_size] for idx in range(0, len(examples), batch_size)]
+        # argmax of the logits equals argmax of the probabilities, so softmax is only needed for return_probs
+        label_arr = np.array([label_map[i] for i in range(len(label_map))], dtype=object)
 
-        batchify_fn = lambda samples, fn=Pad(axis=0, pad_val=pad_token_id): fn(samples)  # input
-
-        results = []
-        for batch in batches:
-            input_ids = batchify_fn(batch)
+        results, probs = [], []
+        for input_ids in batches:
             self.input_handles[0].copy_from_cpu(input_ids)
             self.predictor.run()
-            logits = paddle.to_tensor(self.output_handle.copy_to_cpu())
-            probs = F.softmax(logits, axis=1)
-            idx = paddle.argmax(probs, axis=1).numpy()
-            idx = idx.tolist()
-            labels = [label_map[i] for i in idx]
-            results.extend(labels)
+            logits = self.output_handle.copy_to_cpu()
+            idx = logits.argmax(axis=1)
+            results.extend(label_arr[idx].tolist())
+            if return_probs:
+                probs.extend(F.softmax(paddle.to_tensor(logits), axis=1).numpy().tolist())
+        if return_probs:
+            return results, probs
         return results
 
 
 if __name__ == "__main__":
     # Define predictor to do prediction.
-    predictor = Predictor(args.model_file, args.params_file, args.device, args.max_seq_length)
+    predictor = Predictor(
+        args.model_file,
+        args.params_file,
+        args.device,
+        args.max_seq_length,
+        batch_size=args.batch_size,
+        use_tensorrt=args.use_tensorrt,
+        precision=args.precision,
+        pad_to_multiple_of=args.pad_to_multiple_of,
+        collect_shape=args.collect_shape,
+        shape_file=args.shape_file,
+    )
 
     vocab = Vocab.load_vocabulary(args.vocab_path, unk_token="[UNK]", pad_token="[PAD]")
     pad_token_id = vocab.to_indices("[PAD]")
-    tokenizer = JiebaTokenizer(vocab)
+    tokenizer = use_fast_jieba(JiebaTokenizer(vocab))
     label_map = {0: "negative", 1: "neutral", 2: "positive"}
 
+    if args.collect_shape:
+        predictor.set_dynamic_shape(args.batch_size, pad_token_id=pad_token_id)
+        print("Collected shape range info in {}, please restart with --collect_shape=False.".format(args.shape_file))
+        exit(0)
+
     # Firstly pre-processing prediction data and then do predict.
     data = ["你再骂我我真的不跟你聊了", "你看看我附近有什么好吃的", "我喜欢画画也喜欢唱歌"]
 
-    results = predictor.predict(data, tokenizer, label_map, batch_size=args.batch_size, pad_token_id=pad_token_id)
-    for idx, text in enumerate(data):
-        print("Data: {} \t Label: {}".format(text, results[idx]))
+    if args.print_probs:
+        results, probs = predictor.predict(
+            data, tokenizer, label_map, batch_size=args.batch_size, pad_token_id=pad_token_id, return_probs=True
+        )
+        for idx, text in enumerate(data):
+            print("Data: {} \t Label: {} \t Probs: {}".format(text, results[idx], probs[idx]))
+    else:
+        results = predictor.predict(data, tokenizer, label_map, batch_size=args.batch_size, pad_token_id=pad_token_id)
+        for idx, text in enumerate(data):
+            print("Data: {} \t Label: {}".format(text, results[idx]))
@@ -18,7 +18,7 @@ import paddle.nn.functional as F
 from paddlenlp.data import JiebaTokenizer, Pad, Vocab
 
 from model import TextCNNModel
-from data import preprocess_prediction_data
+from data import preprocess_prediction_data, use_fast_jieba
 
 # yapf: disable
 parser = argparse.ArgumentParser(__doc__)
@@ -86,7 +86,7 @@ if __name__ == "__main__":
 
     # Firstly pre-processing prediction data  and then do predict.
     data = ["你再骂我我真的不跟你聊了", "你看看我附近有什么好吃的", "我喜欢画画也喜欢唱歌"]
-    tokenizer = JiebaTokenizer(vocab)
+    tokenizer = use_fast_jieba(JiebaTokenizer(vocab))
     examples = preprocess_prediction_data(data, tokenizer, pad_token_id)
 
     results = predict(model, examples, label_map=label_map, batch_size=args.batch_size, pad_token_id=pad_token_id)
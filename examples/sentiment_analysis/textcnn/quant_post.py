@@ -0,0 +1,82 @@
+# Copyright (c) 2022 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import os
+
+import paddle
+import paddleslim
+from data import preprocess_prediction_data, read_custom_data, use_fast_jieba
+
+from paddlenlp.data import JiebaTokenizer, Pad, Vocab
+from paddlenlp.datasets import load_dataset
+
+# fmt: off
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument("--vocab_path", type=str, default="./robot_chat_word_dict.txt", help="The path to vocabulary.")
+parser.add_argument("--data_path", type=str, default='./RobotChat', help="The path of datasets to be loaded")
+parser.add_argument("--input_dir", type=str, default='./', help="The directory of the static graph model to be quantized.")
+parser.add_argument("--model_filename", type=str, default='static_graph_params.pdmodel', help="File name of float model.")
+parser.add_argument("--params_filename", type=str, default='static_graph_params.pdiparams', help="File name of float model's parameters.")
+parser.add_argument("--output_dir", type=str, default='./quant_models', help="The directory to save the quantized model.")
+parser.add_argument("--save_model_filename", type=str, default='int8.pdmodel', help="File name of quantized model.")
+parser.add_argument("--save_params_filename", type=str, default='int8.pdiparams', help="File name of quantized model's parameters.")
+parser.add_argument("--batch_size", type=int, default=8, help="Batch size of calibration data.")
+parser.add_argument("--batch_nums", type=int, default=25, help="Number of calibration batches.")
+parser.add_argument("--algo", type=str, default='avg', choices=['abs_max', 'avg', 'mse', 'hist', 'KL'], help="Algorithm to compute the quantization scales of activations.")
+parser.add_argument('--device', choices=['cpu', 'gpu'], default="gpu", help="Select which device to run calibration, defaults to gpu.")
+args = parser.parse_args()
+# fmt: on
+
+
+def quant_post(args):
+    place = paddle.set_device(args.device)
+    exe = paddle.static.Executor(place)
+
+    vocab = Vocab.load_vocabulary(args.vocab_path, unk_token="[UNK]", pad_token="[PAD]")
+    pad_token_id = vocab.to_indices("[PAD]")
+    tokenizer = use_fast_jieba(JiebaTokenizer(vocab))
+
+    # Calibrate on the dev set.
+    dev_ds = load_dataset(read_custom_data, filename=os.path.join(args.data_path, "dev.tsv"), lazy=False)
+
+    def batch_generator_func():
+        batch_data = []
+        for example in dev_ds:
+            batch_data.append(example["text"])
+            if len(batch_data) == args.batch_size:
+                examples = preprocess_prediction_data(batch_data, tokenizer, pad_token_id)
+                yield [Pad(axis=0, pad_val=pad_token_id, dtype="int64")(examples)]
+                batch_data = []
+
+    paddleslim.quant.quant_post_static(
+        exe,
+        args.input_dir,
+        args.output_dir,
+        save_model_filename=args.save_model_filename,
+        save_params_filename=args.save_params_filename,
+        algo=args.algo,
+        batch_generator=batch_generator_func,
+        model_filename=args.model_filename,
+        params_filename=args.params_filename,
+        quantizable_op_type=["conv2d", "matmul", "matmul_v2"],
+        weight_bits=8,
+        weight_quantize_type="channel_wise_abs_max",
+        batch_nums=args.batch_nums,
+    )
+
+
+if __name__ == "__main__":
+    paddle.enable_static()
+    quant_post(args)